@@ -3,7 +3,7 @@
 PSL ➜ MTD Reconciliation — single‑file MVP
 
 Quick start:
-  pip install flask pandas openpyxl xlrd python-multipart
+  pip install flask pandas python-calamine orjson xlsxwriter flask-compress cachetools pyarrow python-multipart
   python app.py
 
 Open http://127.0.0.1:5000
@@ -19,31 +19,46 @@ Notes:
 from __future__ import annotations
 import io
 import os
+import functools
+import gzip
 import re
-import json
+import tempfile
+import threading
+import uuid
 import datetime as dt
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, TypedDict
 
+from cachetools import TTLCache
+import brotli
 from flask import Flask, request, send_file, Response
+from flask_compress import Compress
+import numpy as np
+import orjson
 import pandas as pd
+import xlsxwriter
+from python_calamine import CalamineWorkbook
 
 APP_TITLE = "PSL ➜ MTD Reconciliation (MVP)"
 app = Flask(__name__)
+# br/gzip the JSON and HTML responses (the xlsx export is already zipped)
+app.config.update(COMPRESS_MIN_SIZE=1024, COMPRESS_ALGORITHM=["br", "gzip"])
+Compress(app)
 
 # -------------------------
 # Helpers — column matching
 # -------------------------
+# Candidates are matched against lower-cased, whitespace-collapsed headers
 COL_CANDIDATES = {
-    "date": ["date", "txn date", "doc date", "invoice date", "posting date"],
-    "ref": ["invoice", "inv", "document", "doc no", "reference", "ref"],
-    "supplier": ["supplier", "vendor", "customer", "name", "account name"],
-    "description": ["description", "narrative", "memo", "details"],
-    "net": ["net", "amount (excl)", "amount excl vat", "goods", "taxable amount", "base", "amount"],
-    "vat": ["vat", "tax", "vat amount", "tax amount", "vat amt"],
-    "gross": ["gross", "amount (incl)", "total", "amount incl vat"],
-    "vat_code": ["vat code", "tax code", "code", "t-code", "vat type", "rate", "vat rate"],
-    "currency": ["currency", "curr", "ccy"],
+    "date": ("date", "txn date", "doc date", "invoice date", "posting date"),
+    "ref": ("invoice", "inv", "document", "doc no", "reference", "ref"),
+    "supplier": ("supplier", "vendor", "customer", "name", "account name"),
+    "description": ("description", "narrative", "memo", "details"),
+    "net": ("net", "amount (excl)", "amount excl vat", "goods", "taxable amount", "base", "amount"),
+    "vat": ("vat", "tax", "vat amount", "tax amount", "vat amt"),
+    "gross": ("gross", "amount (incl)", "total", "amount incl vat"),
+    "vat_code": ("vat code", "tax code", "code", "t-code", "vat type", "rate", "vat rate"),
+    "currency": ("currency", "curr", "ccy"),
 }
 
 BOX_NAMES = {
@@ -55,7 +70,8 @@ BOX_NAMES = {
     9: "Value of acquisitions from EU (NI only) (Box 9)",
 }
 
-# Normalisation map — extend freely
+# Normalisation map — extend freely. Every canonical code must also appear as a
+# lower-cased key so already-clean input resolves with one dict lookup.
 NORMALISE_MAP = {
     # 20% equivalents
     "t20": "T20", "t1": "T20", "std": "T20", "standard": "T20", "20": "T20", "20%": "T20",
@@ -70,10 +86,23 @@ NORMALISE_MAP = {
     "eu": "EU", "ec": "EU", "eec": "EU",
 }
 
-VAT_CODE_REGEX = re.compile(r"(?i)(t\s*-?\s*20|t\s*-?\s*1|std|standard|20%|20) |(t\s*-?\s*0|zero|0%) |(exempt|e) |(vx|out\s*of\s*scope|oos) |(t\s*-?\s*5|5%|reduced) |(ni|northern\s*ireland|\bEU\b|\bEC\b)")
+VAT_CODE_REGEX = re.compile(
+    r"(?i)"
+    r"(?P<std>t\s*-?\s*20|t\s*-?\s*1\b|\bstd\b|standard|\b20(?:%|\b))"
+    r"|(?P<zero>t\s*-?\s*0\b|\bz\b|zero|\b0(?:%|\b))"
+    r"|(?P<exempt>exempt|\be\b)"
+    r"|(?P<oos>\bvx\b|out\s*of\s*scope|\boos\b)"
+    r"|(?P<reduced>t\s*-?\s*5\b|\b5(?:%|\b)|reduced)"
+    r"|(?P<ni>\bni\b|northern\s*ireland)"
+    r"|(?P<eu>\beu\b|\bec\b|\beec\b)"
+)
+# Regex group name -> canonical code
+VAT_CODE_GROUPS = {
+    "std": "T20", "zero": "T0", "exempt": "EXEMPT", "oos": "OOS",
+    "reduced": "REDUCED", "ni": "NI", "eu": "EU",
+}
 
-@dataclass
-class Line:
+class Line(TypedDict):
     show: str
     sheet: str
     date: Optional[str]
@@ -85,62 +114,95 @@ class Line:
     gross: float
     vat_code: Optional[str]
     source_type: str  # "purchases"|"sales"|"unknown"
-    raw: Dict[str, Any]
+
+LINE_COLUMNS = list(Line.__annotations__)
+BOX_KEYS = ["1", "4", "6", "7", "8", "9"]
+BOX_IDX = {k: i for i, k in enumerate(BOX_KEYS)}  # box -> column in box accumulators
+SOURCE_TYPES = ("sales", "purchases", "unknown")
+VAT_CODES = ("T20", "T0", "REDUCED", "EXEMPT", "OOS", "NI", "EU", "UNKNOWN")
+# Parsed lines kept server-side so /api/export can rebuild from the full data
+SESSIONS: TTLCache = TTLCache(maxsize=64, ttl=600)
+SESSIONS_LOCK = threading.Lock()
+PREVIEW_LINES = 500  # per show, in the /api/parse payload
+EXCEL_MAX_ROWS = 1_048_576  # per worksheet, header included
+PARSE_WORKERS = 8  # max workbooks parsed concurrently per request
 
 # -------------------------
 # Core parsing & mapping
 # -------------------------
 
-def _find_col(df: pd.DataFrame, keys: List[str]) -> Optional[str]:
-    cols = {c: re.sub(r"\s+", " ", str(c)).strip().lower() for c in df.columns}
+def _norm_cols(columns) -> Dict[str, Any]:
+    """Normalised header -> original column label (first occurrence wins)."""
+    norm: Dict[str, Any] = {}
+    for c in columns:
+        norm.setdefault(re.sub(r"\s+", " ", str(c)).strip().lower(), c)
+    return norm
+
+
+def _find_col(norm_cols: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[Any]:
     for want in keys:
-        want_l = want.lower()
-        for c, lc in cols.items():
-            if want_l == lc:
-                return c
+        if want in norm_cols:
+            return norm_cols[want]
     # fuzzy contains
     for want in keys:
-        w = want.lower()
-        for c in df.columns:
-            if w in str(c).lower():
+        for lc, c in norm_cols.items():
+            if want in lc:
                 return c
     return None
 
 
-def _to_float(x) -> float:
-    try:
-        if pd.isna(x):
-            return 0.0
-        if isinstance(x, str):
-            x = x.replace(",", "").strip()
-        return float(x)
-    except Exception:
-        return 0.0
+# Arrow-backed strings: contiguous buffers, and .str ops run as Arrow kernels
+TEXT_DTYPE = "string[pyarrow]"
+
+
+def _to_float_col(df: pd.DataFrame, c: Optional[str]) -> np.ndarray:
+    """Coerce a whole column to float64; blanks and junk (incl. inf/NaN text) become 0.0."""
+    if not c:
+        return np.zeros(len(df), dtype=np.float64)
+    s = df[c]
+    if not pd.api.types.is_numeric_dtype(s):
+        s = s.astype(TEXT_DTYPE).str.replace(",", "", regex=False).str.strip()
+    out = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    # A non-finite value would turn into NaN in the box weight multiply and poison every total
+    return np.where(np.isfinite(out), out, 0.0)
+
+
+@functools.lru_cache(maxsize=4096)
+def _match_vat_code(s: str) -> Optional[str]:
+    # Clean codes (incl. the canonical ones) are a single dict hit
+    hit = NORMALISE_MAP.get(s)
+    if hit:
+        return hit
+    m = VAT_CODE_REGEX.search(s)
+    return VAT_CODE_GROUPS[m.lastgroup] if m else None
 
 
 def normalise_vat_code(val: Any, description: str = "") -> str:
-    s = str(val or "").strip().lower()
-    # Try regex buckets
+    s = "" if val is None or pd.isna(val) else str(val).strip().lower()
     if s:
-        m = VAT_CODE_REGEX.search(s)
-        if m:
-            block = m.group(0).lower()
-            for k, v in NORMALISE_MAP.items():
-                if k in block:
-                    return v
-    # Try mapping direct tokens
-    tokens = re.split(r"[^a-z0-9%]+", s) if s else []
-    for t in tokens:
-        if t in NORMALISE_MAP:
-            return NORMALISE_MAP[t]
-    # Fallback to description scan
-    d = (description or "").lower()
-    for k, v in NORMALISE_MAP.items():
-        if k in d:
-            return v
+        return _match_vat_code(s) or "UNKNOWN"
+    # No code on the row — fall back to scanning the description
+    d = (description or "").strip().lower()
+    if d:
+        return _match_vat_code(d) or "UNKNOWN"
     return "UNKNOWN"
 
 
+def _vat_code_col(df: pd.DataFrame, c_code: Optional[str], c_desc: Optional[str]) -> np.ndarray:
+    """normalise_vat_code over whole columns, called once per distinct code string."""
+    def clean(c: Optional[str]) -> pd.Series:
+        if not c:
+            return pd.Series("", index=df.index, dtype=TEXT_DTYPE)
+        return df[c].astype(TEXT_DTYPE).fillna("").str.strip().str.lower()
+
+    codes = clean(c_code)
+    # Rows without a code fall back to their description
+    probe = codes.where(codes != "", clean(c_desc))
+    # Ledgers repeat a handful of code strings, so resolve each distinct one once
+    resolved = {v: normalise_vat_code(v) for v in probe.unique()}
+    return probe.map(resolved).to_numpy(dtype=object)
+
+
 def detect_source_type(sheet_name: str, filename: str) -> str:
     probe = f"{sheet_name} {filename}".lower()
     if any(w in probe for w in ["sale", "ar", "output"]):
@@ -150,99 +212,192 @@ def detect_source_type(sheet_name: str, filename: str) -> str:
     return "unknown"
 
 
-def parse_excel(file_storage) -> List[Line]:
-    show = os.path.splitext(file_storage.filename)[0]
-    content = file_storage.read()
-    xls = pd.ExcelFile(io.BytesIO(content))
+def _concat_lines(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=LINE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _cell(v: Any) -> Any:
+    # to_python() reports empty cells as "" and every number as a float; map blanks
+    # to None and whole-number floats back to int, as pandas' calamine reader does
+    if v == "":
+        return None
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
 
-    lines: List[Line] = []
-    for sheet in xls.sheet_names:
+
+def _header_labels(row: List[Any]) -> List[Any]:
+    # Blank header cells get the same placeholder labels pandas would give them
+    return [f"Unnamed: {i}" if v in ("", None) else v for i, v in enumerate(row)]
+
+
+def parse_excel(filename: str, content: bytes) -> pd.DataFrame:
+    show = os.path.splitext(filename)[0]
+    # One calamine workbook for every sheet (.xlsx and .xls alike): the archive and
+    # shared strings are decoded once, and each sheet's cells are loaded once
+    wb = CalamineWorkbook.from_filelike(io.BytesIO(content))
+
+    frames: List[pd.DataFrame] = []
+    for sheet in wb.sheet_names:
         try:
-            df = pd.read_excel(xls, sheet_name=sheet)
-            if df.empty:
+            rows = wb.get_sheet_by_name(sheet).to_python()
+            if len(rows) < 2:
                 continue
+            header = _header_labels(rows[0])
             # Identify columns
-            c_date = _find_col(df, COL_CANDIDATES["date"]) or None
-            c_ref = _find_col(df, COL_CANDIDATES["ref"]) or None
-            c_supplier = _find_col(df, COL_CANDIDATES["supplier"]) or None
-            c_desc = _find_col(df, COL_CANDIDATES["description"]) or None
-            c_net = _find_col(df, COL_CANDIDATES["net"]) or None
-            c_vat = _find_col(df, COL_CANDIDATES["vat"]) or None
-            c_gross = _find_col(df, COL_CANDIDATES["gross"]) or None
-            c_code = _find_col(df, COL_CANDIDATES["vat_code"]) or None
+            cols = _norm_cols(header)
+            c_date = _find_col(cols, COL_CANDIDATES["date"]) or None
+            c_ref = _find_col(cols, COL_CANDIDATES["ref"]) or None
+            c_supplier = _find_col(cols, COL_CANDIDATES["supplier"]) or None
+            c_desc = _find_col(cols, COL_CANDIDATES["description"]) or None
+            c_net = _find_col(cols, COL_CANDIDATES["net"]) or None
+            c_vat = _find_col(cols, COL_CANDIDATES["vat"]) or None
+            c_gross = _find_col(cols, COL_CANDIDATES["gross"]) or None
+            c_code = _find_col(cols, COL_CANDIDATES["vat_code"]) or None
 
             # If no numeric columns, skip
             if not (c_net or c_vat or c_gross):
                 continue
 
-            src_type = detect_source_type(sheet, file_storage.filename)
-
-            for _, r in df.iterrows():
-                net = _to_float(r.get(c_net)) if c_net else 0.0
-                vat = _to_float(r.get(c_vat)) if c_vat else 0.0
-                gross = _to_float(r.get(c_gross)) if c_gross else (net + vat)
-                if net == 0 and vat == 0 and gross == 0:
-                    continue
-                vcode = normalise_vat_code(r.get(c_code), str(r.get(c_desc))) if c_code else normalise_vat_code("", str(r.get(c_desc)))
-                line = Line(
-                    show=show,
-                    sheet=sheet,
-                    date=str(r.get(c_date)) if c_date else None,
-                    ref=str(r.get(c_ref)) if c_ref else None,
-                    supplier=str(r.get(c_supplier)) if c_supplier else None,
-                    description=str(r.get(c_desc)) if c_desc else None,
-                    net=net,
-                    vat=vat,
-                    gross=gross,
-                    vat_code=vcode,
-                    source_type=src_type,
-                    raw={k: (None if pd.isna(v) else v) for k, v in r.items()},
-                )
-                lines.append(line)
+            # Build only the mapped columns, straight from their positions in the rows
+            wanted = {c: header.index(c) for c in (c_date, c_ref, c_supplier, c_desc, c_net, c_vat, c_gross, c_code) if c is not None}
+            body = rows[1:]
+            df = pd.DataFrame({c: [_cell(r[i]) for r in body] for c, i in wanted.items()})
+            df = df.convert_dtypes(dtype_backend="pyarrow")
+
+            src_type = detect_source_type(sheet, filename)
+
+            # Build every line column-wise and emit plain dicts in one go
+            n = len(df)
+            none_col = np.full(n, None, dtype=object)
+
+            def text(c: Optional[str]) -> np.ndarray:
+                return df[c].astype(TEXT_DTYPE).to_numpy(dtype=object, na_value=None) if c else none_col
+
+            net_arr = _to_float_col(df, c_net)
+            vat_arr = _to_float_col(df, c_vat)
+            gross_arr = _to_float_col(df, c_gross) if c_gross else net_arr + vat_arr
+
+            out_df = pd.DataFrame({
+                "show": show,
+                "sheet": sheet,
+                "date": text(c_date),
+                "ref": text(c_ref),
+                "supplier": text(c_supplier),
+                "description": text(c_desc),
+                "net": net_arr,
+                "vat": vat_arr,
+                "gross": gross_arr,
+                "vat_code": _vat_code_col(df, c_code, c_desc),
+                "source_type": src_type,
+            })
+            keep = (net_arr != 0) | (vat_arr != 0) | (gross_arr != 0)
+            frames.append(out_df[keep])
         except Exception:
             continue
-    return lines
+    return _concat_lines(frames)
 
 # -------------------------
 # Box assignment logic
 # -------------------------
 
-def assign_boxes(lines: List[Line]) -> Dict[str, Any]:
-    per_show: Dict[str, Dict[str, Any]] = {}
+def _boxes_dict(acc: np.ndarray) -> Dict[str, float]:
+    return {k: float(acc[i]) for k, i in BOX_IDX.items()}
+
+
+def _box_rule(source_type: Optional[str], code: Optional[str]) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Which boxes a line's VAT and net feed, as ({box: weight}, {box: weight})."""
+    vat_to: Dict[str, float] = {}
+    net_to: Dict[str, float] = {}
+    # Simplified logic:
+    # Box 1 and 6 for sales at standard rate
+    if source_type == "sales" and code == "T20":
+        vat_to["1"] = 1.0
+        net_to["6"] = 1.0
+    # Box 4 and 7 for purchases with reclaimable VAT
+    elif source_type in ("purchases", "unknown") and code in ("T20", "REDUCED"):
+        vat_to["4"] = 1.0
+        net_to["7"] = 1.0
+    # Zero-rated sales contribute to Box 6 net
+    elif source_type == "sales" and code in ("T0",):
+        net_to["6"] = 1.0
+    # NI/EU heuristics
+    if code in ("NI", "EU") and source_type == "sales":
+        net_to["8"] = 1.0
+    if code in ("NI", "EU") and source_type != "sales":
+        net_to["9"] = 1.0
+    return vat_to, net_to
+
+
+def _box_weight_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluate _box_rule once per (source type, VAT code) pair.
+
+    Tables are indexed [source_type_id, vat_code_id, box]; the trailing slot on
+    each axis stands for any value outside SOURCE_TYPES / VAT_CODES (id -1).
+    """
+    shape = (len(SOURCE_TYPES) + 1, len(VAT_CODES) + 1, len(BOX_KEYS))
+    vat_w = np.zeros(shape, dtype=np.float64)
+    net_w = np.zeros(shape, dtype=np.float64)
+    for si, st in enumerate(SOURCE_TYPES + (None,)):
+        for ci, code in enumerate(VAT_CODES + (None,)):
+            vat_to, net_to = _box_rule(st, code)
+            for box, w in vat_to.items():
+                vat_w[si, ci, BOX_IDX[box]] = w
+            for box, w in net_to.items():
+                net_w[si, ci, BOX_IDX[box]] = w
+    return vat_w, net_w
+
+
+VAT_BOX_WEIGHTS, NET_BOX_WEIGHTS = _box_weight_tables()
+
+
+def box_totals(lines: pd.DataFrame) -> Tuple[pd.Index, np.ndarray]:
+    """Per-show box totals: (shows, array of shape (len(shows), len(BOX_KEYS)))."""
+    # Small-int ids (-1 = not in the list, which hits the tables' trailing slot)
+    st_ids = pd.Categorical(lines["source_type"], categories=SOURCE_TYPES).codes
+    code_ids = pd.Categorical(lines["vat_code"], categories=VAT_CODES).codes
+    net = lines["net"].to_numpy(dtype=np.float64)
+    vat = lines["vat"].to_numpy(dtype=np.float64)
+
+    # One row per line, one column per box (see BOX_IDX)
+    box_matrix = (
+        VAT_BOX_WEIGHTS[st_ids, code_ids] * vat[:, None]
+        + NET_BOX_WEIGHTS[st_ids, code_ids] * net[:, None]
+    )
+
+    # Sum each show's contiguous block of rows in one reduceat call. Ids follow first
+    # appearance and every file is one show, so rows are normally already grouped;
+    # sort only if the same show name turns up in more than one upload.
+    show_ids, shows = pd.factorize(lines["show"])
+    if not len(shows):
+        return shows, np.zeros((0, len(BOX_KEYS)), dtype=np.float64)
+    if (np.diff(show_ids) < 0).any():
+        order = np.argsort(show_ids, kind="stable")
+        show_ids, box_matrix = show_ids[order], box_matrix[order]
+    offsets = np.flatnonzero(np.r_[True, show_ids[1:] != show_ids[:-1]])
+    return shows, np.add.reduceat(box_matrix, offsets, axis=0)
+
+
+def assign_boxes(lines: pd.DataFrame) -> Dict[str, Any]:
+    shows, totals = box_totals(lines)
+    # One pass over the capped previews, split by show
+    previews = {
+        show: grp.to_dict("records")
+        for show, grp in lines.groupby("show", sort=False).head(PREVIEW_LINES).groupby("show", sort=False)
+    }
 
-    def init_acc() -> Dict[str, float]:
-        return {"1": 0.0, "4": 0.0, "6": 0.0, "7": 0.0, "8": 0.0, "9": 0.0}
-
-    # Aggregate
-    for ln in lines:
-        show_acc = per_show.setdefault(ln.show, {"boxes": init_acc(), "lines": []})
-        # Simplified logic:
-        code = ln.vat_code
-        st = ln.source_type
-        # Box 1 and 6 for sales at standard rate
-        if st == "sales" and code == "T20":
-            show_acc["boxes"]["1"] += ln.vat
-            show_acc["boxes"]["6"] += ln.net
-        # Box 4 and 7 for purchases with reclaimable VAT
-        elif st in ("purchases", "unknown") and code in ("T20", "REDUCED"):
-            show_acc["boxes"]["4"] += ln.vat
-            show_acc["boxes"]["7"] += ln.net
-        # Zero-rated sales contribute to Box 6 net
-        elif st == "sales" and code in ("T0",):
-            show_acc["boxes"]["6"] += ln.net
-        # NI/EU heuristics
-        if code in ("NI", "EU") and st == "sales":
-            show_acc["boxes"]["8"] += ln.net
-        if code in ("NI", "EU") and st != "sales":
-            show_acc["boxes"]["9"] += ln.net
-
-        show_acc["lines"].append(asdict(ln))
+    per_show: Dict[str, Dict[str, Any]] = {}
+    for i, show in enumerate(shows):
+        per_show[show] = {
+            "boxes": _boxes_dict(totals[i]),
+            "lines": previews.get(show, []),
+        }
 
     # Consolidated
-    consolidated = {"1": 0.0, "4": 0.0, "6": 0.0, "7": 0.0, "8": 0.0, "9": 0.0}
-    for show, acc in per_show.items():
-        for k in consolidated:
-            consolidated[k] += acc["boxes"][k]
+    consolidated = _boxes_dict(totals.sum(axis=0))
 
     return {"per_show": per_show, "consolidated": consolidated}
 
@@ -298,16 +453,19 @@ INDEX_HTML = f"""
       }}
       t += `</tbody></table>`;
       return t;
-    }
+    }}
 
     async function exportPack() {{
       if (!window.state) return alert('Parse some files first.');
       const res = await fetch('/api/export', {{
         method: 'POST',
         headers: {{ 'Content-Type': 'application/json' }},
-        body: JSON.stringify(window.state)
+        body: JSON.stringify({{ session_id: window.state.session_id }})
       }});
-      if (!res.ok) return alert('Export failed');
+      if (!res.ok) {{
+        const err = await res.json().catch(() => ({{}}));
+        return alert(err.error || 'Export failed');
+      }}
       const blob = await res.blob();
       const url = URL.createObjectURL(blob);
       const a = document.createElement('a');
@@ -348,9 +506,65 @@ INDEX_HTML = f"""
 </html>
 """
 
+def _write_sheet(wb: xlsxwriter.Workbook, name: str, df: pd.DataFrame, header_fmt) -> None:
+    ws = wb.add_worksheet(name)
+    ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+    body = df.astype(object).where(df.notna(), None)
+    for i, row in enumerate(body.itertuples(index=False, name=None), start=1):
+        ws.write_row(i, 0, row)
+
+# The page is static, so it's written out once (plus br and gzip copies) and served
+# as a file: conditional requests / ETags, browser caching, no per-hit re-encoding.
+# It lives in the instance folder, not static/, so /static/ can't serve the raw .gz/.br.
+INDEX_PATH = os.path.join(app.instance_path, "index.html")
+INDEX_MAX_AGE = 3600
+# Precompressed variants, in order of preference (matches COMPRESS_ALGORITHM)
+INDEX_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _write_if_changed(path: str, data: bytes) -> None:
+    # Leave an up-to-date file alone so its mtime (Last-Modified/ETag) survives restarts
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    except FileNotFoundError:
+        pass
+    # Write to a temp file and swap it in, so concurrent workers never serve a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _write_index_assets() -> None:
+    data = INDEX_HTML.encode("utf-8")
+    os.makedirs(app.instance_path, exist_ok=True)
+    # Each file is checked on its own, so a missing or stale variant is always rebuilt
+    _write_if_changed(INDEX_PATH, data)
+    _write_if_changed(INDEX_PATH + ".br", brotli.compress(data))
+    _write_if_changed(INDEX_PATH + ".gz", gzip.compress(data, mtime=0))
+
+
+_write_index_assets()
+
 @app.get("/")
 def index() -> Response:
-    return Response(INDEX_HTML, mimetype="text/html")
+    # Hand the browser a precompressed copy; flask-compress skips responses that
+    # already carry a Content-Encoding. A client taking neither br nor gzip gets
+    # the identity file, which flask-compress has no algorithm to apply to either.
+    for encoding, suffix in INDEX_ENCODINGS:
+        if request.accept_encodings.quality(encoding):
+            resp = send_file(INDEX_PATH + suffix, mimetype="text/html", conditional=True, max_age=INDEX_MAX_AGE)
+            resp.headers["Content-Encoding"] = encoding
+            resp.headers.pop("Content-Disposition", None)  # don't advertise the variant's filename
+            resp.vary.add("Accept-Encoding")
+            return resp
+    return send_file(INDEX_PATH, mimetype="text/html", conditional=True, max_age=INDEX_MAX_AGE)
 
 @app.post("/api/parse")
 def api_parse():
@@ -358,53 +572,85 @@ def api_parse():
     if not files:
         return {"error": "No files uploaded"}, 400
 
-    all_lines: List[Line] = []
-    for fs in files:
+    # Read request bodies up front, then parse the workbooks concurrently
+    uploads = [(fs.filename, fs.read()) for fs in files]
+    with ThreadPoolExecutor(max_workers=min(PARSE_WORKERS, len(uploads))) as ex:
+        futures = [ex.submit(parse_excel, name, content) for name, content in uploads]
+
+    frames: List[pd.DataFrame] = []
+    for (name, _), fut in zip(uploads, futures):
         try:
-            all_lines.extend(parse_excel(fs))
+            frames.append(fut.result())
         except Exception as e:
-            return {"error": f"Failed to parse {fs.filename}: {e}"}, 400
+            return {"error": f"Failed to parse {name}: {e}"}, 400
+
+    lines = _concat_lines(frames)
+    session_id = uuid.uuid4().hex
+    with SESSIONS_LOCK:
+        SESSIONS[session_id] = lines
 
-    result = assign_boxes(all_lines)
-    # For transport, drop raw lines to keep payload lean
-    for show, acc in result["per_show"].items():
-        acc["lines"] = acc["lines"][:500]  # cap preview
-    return json.dumps(result), 200, {"Content-Type": "application/json"}
+    # Line previews are capped per show inside assign_boxes
+    result = assign_boxes(lines)
+    result["session_id"] = session_id
+    body = orjson.dumps(result, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return Response(body, mimetype="application/json")
 
 @app.post("/api/export")
 def api_export():
-    payload = request.get_json(silent=True) or {}
-    consolidated = payload.get("consolidated", {})
-    per_show = payload.get("per_show", {})
+    payload = request.get_json(silent=True)
+    session_id = payload.get("session_id") if isinstance(payload, dict) else None
+    if not isinstance(session_id, str):
+        return {"error": "Expected a JSON object with a string session_id"}, 400
+    with SESSIONS_LOCK:
+        lines = SESSIONS.get(session_id)
+    if lines is None:
+        return {"error": "Session expired or unknown — parse the files again"}, 404
+
+    # Each show's lines go on one detail sheet under a header row
+    counts = lines["show"].value_counts(sort=False)
+    too_big = counts[counts > EXCEL_MAX_ROWS - 1]
+    if len(too_big):
+        show, n = too_big.index[0], int(too_big.iloc[0])
+        return {"error": f"{show} has {n:,} lines; an Excel sheet holds at most {EXCEL_MAX_ROWS - 1:,}"}, 400
+    shows, totals = box_totals(lines)
 
     out = io.BytesIO()
-    with pd.ExcelWriter(out, engine="openpyxl") as xw:
-        # Summary sheet
-        summary_rows = []
-        for k in ["1","4","6","7","8","9"]:
-            summary_rows.append([BOX_NAMES.get(int(k), f"Box {k}"), float(consolidated.get(k, 0.0))])
-        df_sum = pd.DataFrame(summary_rows, columns=["Box", "Total (£)"])
-        df_sum.to_excel(xw, sheet_name="Summary", index=False)
-
-        # Per-show box totals
-        show_rows = []
-        for show, acc in per_show.items():
-            for k in ["1","4","6","7","8","9"]:
-                show_rows.append([show, BOX_NAMES.get(int(k), f"Box {k}"), float(acc.get("boxes", {}).get(k, 0.0))])
-        pd.DataFrame(show_rows, columns=["Show", "Box", "Total (£)"]).to_excel(xw, sheet_name="Per-Show Totals", index=False)
-
-        # Detail tabs (optional)
-        for show, acc in per_show.items():
-            lines = acc.get("lines", [])
-            if not lines:
-                continue
-            df = pd.DataFrame(lines)
-            # Trim raw if present
-            if "raw" in df.columns:
-                df.drop(columns=["raw"], inplace=True)
-            safe_name = re.sub(r"[^A-Za-z0-9]+", "_", show)[:28]
-            df.to_excel(xw, sheet_name=f"{safe_name}_detail", index=False)
-
+    # constant_memory flushes each row as soon as the next one starts, so rows must be
+    # written top to bottom — hence _write_sheet rather than DataFrame.to_excel, which
+    # emits cells column by column
+    # Ledger text is data: never turn it into hyperlinks (which silently drop long or
+    # excess URLs) or live formulas
+    wb = xlsxwriter.Workbook(out, {"constant_memory": True, "strings_to_urls": False, "strings_to_formulas": False})
+    header_fmt = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+
+    # Summary sheet
+    consolidated = totals.sum(axis=0)
+    summary_rows = []
+    for k, i in BOX_IDX.items():
+        summary_rows.append([BOX_NAMES.get(int(k), f"Box {k}"), float(consolidated[i])])
+    df_sum = pd.DataFrame(summary_rows, columns=["Box", "Total (£)"])
+    _write_sheet(wb, "Summary", df_sum, header_fmt)
+
+    # Per-show box totals
+    show_rows = []
+    for show, show_totals in zip(shows, totals):
+        for k, i in BOX_IDX.items():
+            show_rows.append([show, BOX_NAMES.get(int(k), f"Box {k}"), float(show_totals[i])])
+    _write_sheet(wb, "Per-Show Totals", pd.DataFrame(show_rows, columns=["Show", "Box", "Total (£)"]), header_fmt)
+
+    # Detail tabs — every parsed line, not just the /api/parse preview
+    used_names = set()
+    for show, df in lines.groupby("show", sort=False):
+        # Excel caps sheet names at 31 chars and xlsxwriter rejects duplicates
+        safe_name = re.sub(r"[^A-Za-z0-9]+", "_", show)[:24]
+        sheet_name, n = f"{safe_name}_detail", 1
+        while sheet_name.lower() in used_names:
+            n += 1
+            sheet_name = f"{safe_name[:22]}{n}_detail"
+        used_names.add(sheet_name.lower())
+        _write_sheet(wb, sheet_name, df, header_fmt)
+
+    wb.close()
     out.seek(0)
     fname = f"PSLtoMTD_SubmissionPack_{dt.datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
     return send_file(out, as_attachment=True, download_name=fname, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
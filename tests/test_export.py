@@ -0,0 +1,40 @@
+import io
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def _parse(client, df: pd.DataFrame, filename: str) -> str:
+    buf = io.BytesIO()
+    options = {"strings_to_urls": False, "strings_to_formulas": False}
+    with pd.ExcelWriter(buf, engine="xlsxwriter", engine_kwargs={"options": options}) as xw:
+        df.to_excel(xw, index=False, sheet_name="Sales")
+    buf.seek(0)
+    res = client.post("/api/parse", data={"files": [(buf, filename)]}, content_type="multipart/form-data")
+    assert res.status_code == 200
+    return res.get_json()["session_id"]
+
+
+def test_export_keeps_url_and_formula_text_as_strings():
+    long_url = "http://example.com/" + "a" * 2100
+    formula = "=cmd|' /C calc'!A0"
+    df = pd.DataFrame({
+        "Reference": ["INV1", "INV2"],
+        "Description": [long_url, formula],
+        "Net": [100.0, 200.0],
+        "VAT": [20.0, 40.0],
+        "VAT Code": ["T20", "T20"],
+    })
+    client = app.app.test_client()
+    session_id = _parse(client, df, "Show_sales.xlsx")
+
+    res = client.post("/api/export", json={"session_id": session_id})
+    assert res.status_code == 200
+
+    detail = pd.read_excel(io.BytesIO(res.get_data()), sheet_name="Show_sales_detail", engine="calamine")
+    assert detail["description"].tolist() == [long_url, formula]